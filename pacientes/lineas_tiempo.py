@@ -0,0 +1,166 @@
+"""
+Línea de tiempo precalculada por paciente para el gráfico de evolución.
+
+Cada fila de 'lineas_tiempo' guarda, ya ordenadas por fecha, las fechas
+empaquetadas (array de ordinales), un byte de riesgo por consulta y los textos
+de medicación listos para el tooltip. La API la sirve con una búsqueda por PK
+y recorta el rango desde/hasta con bisect, sin volver a unir consultas y
+medicaciones.
+"""
+import datetime
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import transacciones
+from .models import Consulta, LineaTiempoPaciente, Medicacion, Paciente
+
+SIN_MEDICACION = "Sin medicación registrada"
+
+# Pacientes por lote al reconstruir (acota memoria y parámetros por consulta SQL)
+LOTE = 500
+
+# Marcado suspendido en la conexión (ver sin_marcar; las conexiones son por hilo)
+_ATRIBUTO_SIN_MARCAR = "_lineas_tiempo_sin_marcar"
+
+
+def texto_medicacion(m):
+    """'nombre dosis (esquema)', ignorando vacíos y los 'nan' que deja pandas; None si no hay nombre."""
+    nombre = (m.nombre or "").strip()
+    dosis = (m.dosis or "").strip()
+    esquema = (m.esquema or "").strip()
+    if not nombre or nombre.lower() == "nan":
+        return None
+    txt = nombre
+    if dosis and dosis.lower() != "nan":
+        txt += f" {dosis}"
+    if esquema and esquema.lower() != "nan":
+        txt += f" ({esquema})"
+    return txt
+
+
+def reconstruir(paciente_ids):
+    """
+    Recalcula (o borra, si el paciente ya no existe) las líneas de tiempo
+    indicadas; pensado para lotes de hasta LOTE pacientes. Lee siempre de
+    'default': aunque se llame desde una vista servida por una réplica, lo que
+    se guarda en la primaria no puede salir de datos atrasados.
+    """
+    paciente_ids = set(paciente_ids)
+    existentes = set(
+        Paciente.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=paciente_ids).values_list("pk", flat=True)
+    )
+    LineaTiempoPaciente.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=paciente_ids - existentes).delete()
+
+    # Medicaciones por join con el paciente: los parámetros no crecen con el número de consultas
+    meds_por_consulta = defaultdict(list)
+    medicaciones = (
+        Medicacion.objects.using(DEFAULT_DB_ALIAS)
+        .filter(consulta__paciente_id__in=existentes)
+        .order_by("medicacion_id")
+        .only("consulta_id", "nombre", "dosis", "esquema")
+    )
+    for m in medicaciones:
+        texto = texto_medicacion(m)
+        if texto:
+            meds_por_consulta[m.consulta_id].append(texto)
+
+    datos = {pid: (array("i"), bytearray(), []) for pid in existentes}
+    consultas = (
+        Consulta.objects.using(DEFAULT_DB_ALIAS)
+        .filter(paciente_id__in=existentes)
+        .order_by("paciente_id", "fecha_consulta", "consulta_id")
+        .values_list("consulta_id", "paciente_id", "fecha_consulta", "riesgo")
+    )
+    for consulta_id, paciente_id, fecha, riesgo in consultas:
+        fechas, riesgos, meds = datos[paciente_id]
+        fechas.append(fecha.toordinal())
+        riesgos.append(riesgo)
+        meds.append(meds_por_consulta.get(consulta_id) or [SIN_MEDICACION])
+
+    lineas = [
+        LineaTiempoPaciente(paciente_id=pid, fechas=fechas.tobytes(), riesgos=bytes(riesgos), meds=meds)
+        for pid, (fechas, riesgos, meds) in datos.items()
+    ]
+    LineaTiempoPaciente.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+        lineas, update_conflicts=True, unique_fields=["paciente"], update_fields=["fechas", "riesgos", "meds"],
+    )
+    return {linea.paciente_id: linea for linea in lineas}
+
+
+def reconstruir_en_lotes(paciente_ids):
+    paciente_ids = sorted(paciente_ids)
+    for i in range(0, len(paciente_ids), LOTE):
+        reconstruir(paciente_ids[i:i + LOTE])
+
+
+class _Pendientes:
+    """Pacientes y consultas cambiados en la transacción; se reconstruyen al confirmarla."""
+
+    def __init__(self):
+        self.pacientes = set()
+        self.consultas = set()
+
+    def __call__(self):
+        pacientes = set(self.pacientes)
+        consultas = sorted(self.consultas)
+        for i in range(0, len(consultas), LOTE):
+            # Las consultas ya borradas no aparecen: su propio post_delete marcó al paciente
+            pacientes.update(
+                Consulta.objects.using(DEFAULT_DB_ALIAS)
+                .filter(pk__in=consultas[i:i + LOTE])
+                .values_list("paciente_id", flat=True)
+            )
+        reconstruir_en_lotes(pacientes)
+
+
+def marcar(paciente_id=None, consulta_id=None):
+    """
+    Agenda la reconstrucción de la línea del paciente (o del paciente de la
+    consulta) al confirmar la transacción actual; dentro de una importación
+    atómica cada paciente se reconstruye una sola vez. Las consultas se
+    resuelven a pacientes recién entonces, con una sola consulta SQL por lote.
+    """
+    if getattr(transaction.get_connection(), _ATRIBUTO_SIN_MARCAR, False):
+        return
+    pendientes = transacciones.de_la_transaccion("lineas_tiempo", crear=_Pendientes)
+    inmediato = pendientes is None
+    if inmediato:
+        pendientes = _Pendientes()
+    if paciente_id is not None:
+        pendientes.pacientes.add(paciente_id)
+    if consulta_id is not None:
+        pendientes.consultas.add(consulta_id)
+    if inmediato:
+        # En autocommit el cambio ya está confirmado
+        pendientes()
+
+
+@contextmanager
+def sin_marcar():
+    """
+    Ignora `marcar` dentro del bloque, para cargas masivas que después
+    reconstruyen todo de una vez con reconstruir_en_lotes().
+    """
+    connection = transaction.get_connection()
+    setattr(connection, _ATRIBUTO_SIN_MARCAR, True)
+    try:
+        yield
+    finally:
+        setattr(connection, _ATRIBUTO_SIN_MARCAR, False)
+
+
+def serie(linea, desde=None, hasta=None):
+    """Datos del gráfico ({labels, riesgo, meds}) recortados a [desde, hasta] (datetime.date o None)."""
+    fechas = array("i")
+    fechas.frombytes(linea.fechas)
+    inicio = bisect_left(fechas, desde.toordinal()) if desde else 0
+    fin = bisect_right(fechas, hasta.toordinal()) if hasta else len(fechas)
+    return {
+        "labels": [datetime.date.fromordinal(o).isoformat() for o in fechas[inicio:fin]],
+        "riesgo": list(bytes(linea.riesgos)[inicio:fin]),
+        "meds": linea.meds[inicio:fin],
+    }
@@ -0,0 +1,75 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from pacientes import particiones
+from pacientes.models import Consulta, Medicacion
+
+
+def _relaciones(plan):
+    """Nombres de tabla/partición que el plan realmente recorre."""
+    encontradas = set()
+    pendientes = [plan]
+    while pendientes:
+        nodo = pendientes.pop()
+        if "Relation Name" in nodo:
+            encontradas.add(nodo["Relation Name"])
+        pendientes.extend(nodo.get("Plans", []))
+    return encontradas
+
+
+class Command(BaseCommand):
+    help = ("Mide las consultas del dashboard filtradas por fecha y muestra qué particiones "
+            "recorre cada una (partition pruning).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", type=str, required=True, help="Fecha inicial (YYYY-MM-DD)")
+        parser.add_argument("--hasta", type=str, required=True, help="Fecha final (YYYY-MM-DD)")
+        parser.add_argument("--repeticiones", type=int, default=20, help="Ejecuciones por consulta")
+        parser.add_argument("--database", type=str, default="default", help="Alias de base de datos")
+
+    def handle(self, *args, **opts):
+        using = opts["database"]
+        connection = connections[using]
+        desde, hasta = opts["desde"], opts["hasta"]
+
+        consultas = Consulta.objects.using(using).filter(fecha_consulta__gte=desde, fecha_consulta__lte=hasta)
+        medicaciones = Medicacion.objects.using(using).filter(fecha_consulta__gte=desde, fecha_consulta__lte=hasta)
+        casos = {
+            "conteo consultas": consultas.values("consulta_id"),
+            "top diagnósticos": (
+                consultas.exclude(diagnostico__isnull=True)
+                         .values("diagnostico")
+                         .annotate(total=Count("consulta_id"))
+                         .order_by("-total")[:5]
+            ),
+            "medicaciones del rango": medicaciones.values("consulta_id", "nombre"),
+        }
+
+        particionada = particiones.esta_particionada(connection, "consultas")
+        if particionada:
+            total = len(particiones.anios_particionados(connection, "consultas"))
+            self.stdout.write(f"Particiones anuales por tabla: {total}")
+        else:
+            self.stdout.write("Tablas sin particionar (o motor sin soporte): solo se miden tiempos.")
+
+        for nombre, qs in casos.items():
+            sql, params = qs.query.sql_with_params()
+            with connection.cursor() as cursor:
+                inicio = time.perf_counter()
+                for _ in range(opts["repeticiones"]):
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                ms = (time.perf_counter() - inicio) * 1000 / opts["repeticiones"]
+
+                linea = f"{nombre:<24} {ms:8.2f} ms"
+                if particionada:
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    recorridas = sorted(_relaciones(plan[0]["Plan"]))
+                    linea += f" | particiones: {', '.join(recorridas)}"
+            self.stdout.write(linea)
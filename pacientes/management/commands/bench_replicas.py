@@ -0,0 +1,97 @@
+import multiprocessing
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from pacientes import views
+from pacientes.models import Consulta
+from saludmental_dashboard.routers import primaria_fijada
+
+PIN_BENCH = settings.BASE_DIR / ".replica_pin.bench"
+
+
+def _cliente(paciente_ids, fin, indice):
+    """Alterna dashboard y API de evolución hasta `fin`; devuelve las peticiones hechas."""
+    factory = RequestFactory()
+    hechas, i = 0, indice
+    try:
+        while time.time() < fin:
+            if i % 2:
+                views.dashboard(factory.get("/"))
+            else:
+                pid = paciente_ids[i % len(paciente_ids)]
+                views.api_evolucion_paciente(factory.get("/"), paciente_id=pid)
+            hechas += 1
+            i += 1
+    finally:
+        connections.close_all()
+    return hechas
+
+
+def _proceso(args):
+    # Cada proceso aplica su propia configuración (override_settings no cruza el fork de forma fiable)
+    replicas, paciente_ids, fin, indice = args
+    with override_settings(DATABASE_REPLICAS=replicas, REPLICA_PIN_ARCHIVO=PIN_BENCH):
+        return _cliente(paciente_ids, fin, indice)
+
+
+class Command(BaseCommand):
+    help = ("Carga concurrente de lecturas (dashboard + API de evolución) con 0..N réplicas, "
+            "para ver cómo escala el throughput de lectura. Con --procesos cada cliente es un "
+            "proceso aparte y no compite por el GIL.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=8, help="Clientes concurrentes (hilos)")
+        parser.add_argument("--procesos", type=int, default=0,
+                            help="Clientes concurrentes como procesos (reemplaza a --hilos)")
+        parser.add_argument("--segundos", type=float, default=10, help="Duración de cada corrida")
+
+    def handle(self, *args, **opts):
+        if opts["segundos"] <= 0:
+            raise CommandError("--segundos debe ser mayor que 0.")
+        replicas = list(settings.DATABASE_REPLICAS)
+        if not replicas:
+            raise CommandError("No hay réplicas configuradas (variable DB_REPLICAS).")
+        if primaria_fijada():
+            self.stdout.write(self.style.WARNING("Primaria fijada tras una importación: se ignora durante el benchmark."))
+
+        paciente_ids = list(Consulta.objects.values_list("paciente_id", flat=True).distinct()[:200])
+        if not paciente_ids:
+            raise CommandError("No hay consultas cargadas para medir.")
+
+        clientes = opts["procesos"] or opts["hilos"]
+        modo = "procesos" if opts["procesos"] else "hilos"
+        self.stdout.write(f"{clientes} clientes ({modo}), {opts['segundos']:g} s por corrida")
+
+        base = None
+        for n in range(len(replicas) + 1):
+            fin = time.time() + opts["segundos"]
+            if opts["procesos"]:
+                # Las conexiones abiertas no deben heredarse en los procesos hijos
+                connections.close_all()
+                with multiprocessing.get_context("fork").Pool(clientes) as pool:
+                    contador = pool.map(_proceso, [(replicas[:n], paciente_ids, fin, k) for k in range(clientes)])
+            else:
+                contador = [0] * clientes
+
+                def cliente(k):
+                    contador[k] = _cliente(paciente_ids, fin, k)
+
+                with override_settings(DATABASE_REPLICAS=replicas[:n], REPLICA_PIN_ARCHIVO=PIN_BENCH):
+                    hilos = [threading.Thread(target=cliente, args=(k,)) for k in range(clientes)]
+                    for h in hilos:
+                        h.start()
+                    for h in hilos:
+                        h.join()
+
+            rps = sum(contador) / opts["segundos"]
+            if n == 0:
+                base = rps
+            destino = ", ".join(replicas[:n]) if n else "default"
+            # Sin peticiones en la corrida base (p. ej. --segundos muy corto) no hay proporción
+            relacion = f"x{rps / base:.2f}" if base else "x-"
+            self.stdout.write(f"réplicas={n} ({destino}): {rps:8.1f} req/s  {relacion}")
@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from pacientes import particiones
+
+
+class Command(BaseCommand):
+    help = "Crea por adelantado las particiones anuales de CONSULTAS y MEDICACIONES (solo PostgreSQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--anios", type=int, default=2, help="Años a futuro a cubrir (default 2)")
+        parser.add_argument("--desde", type=int, default=None, help="Primer año a crear (default: año actual)")
+        parser.add_argument("--database", type=str, default="default", help="Alias de base de datos")
+
+    def handle(self, *args, **opts):
+        using = opts["database"]
+        if not particiones.esta_particionada(connections[using], "consultas"):
+            self.stdout.write("Las tablas no están particionadas: nada que hacer.")
+            return
+
+        actual = datetime.date.today().year
+        desde = opts["desde"] or actual
+        hasta = actual + opts["anios"]
+        if desde > hasta:
+            raise CommandError(f"--desde ({desde}) es posterior al último año a cubrir ({hasta}).")
+
+        with transaction.atomic(using=using):
+            creados = particiones.asegurar_particiones(range(desde, hasta + 1), using=using)
+
+        if creados:
+            self.stdout.write(self.style.SUCCESS(f"Particiones creadas: {', '.join(map(str, creados))}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Ya existían todas las particiones {desde}-{hasta}."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from pacientes import particiones
+
+
+class Command(BaseCommand):
+    help = ("Separa las particiones de años antiguos (<= --hasta) y las renombra a "
+            "'<tabla>_<año>_archivo' para archivarlas (pg_dump) o borrarlas. Solo PostgreSQL.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hasta", type=int, required=True, help="Último año a desvincular (inclusive)")
+        parser.add_argument("--database", type=str, default="default", help="Alias de base de datos")
+
+    def handle(self, *args, **opts):
+        using = opts["database"]
+        if not particiones.esta_particionada(connections[using], "consultas"):
+            self.stdout.write("Las tablas no están particionadas: nada que hacer.")
+            return
+
+        with transaction.atomic(using=using):
+            anios = particiones.desvincular_particiones(opts["hasta"], using=using)
+
+        if anios:
+            self.stdout.write(self.style.SUCCESS(f"Particiones desvinculadas: {', '.join(map(str, anios))}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"No hay particiones hasta {opts['hasta']}."))
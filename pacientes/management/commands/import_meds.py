@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from pacientes.models import Paciente, Consulta, Medicacion
+from pacientes.particiones import asegurar_particiones
+from saludmental_dashboard.routers import fijar_primaria
 import pandas as pd
 from pathlib import Path
 
@@ -53,6 +55,9 @@ class Command(BaseCommand):
         if "esquema" not in df.columns:
             df["esquema"] = ""
 
+        # Si las tablas están particionadas, cada año importado necesita su partición
+        asegurar_particiones(df["fecha_consulta"].dt.year.unique().tolist())
+
         nuevas_consultas = 0
         nuevas_meds = 0
 
@@ -115,6 +120,9 @@ class Command(BaseCommand):
                     )
                     nuevas_meds += 1
 
+        # Leer lo escrito: el dashboard lee de 'default' hasta que las réplicas se pongan al día
+        transaction.on_commit(fijar_primaria)
+
         self.stdout.write(self.style.SUCCESS(
             f"Importación OK. Consultas nuevas: {nuevas_consultas} | Medicaciones nuevas: {nuevas_meds}"
         ))
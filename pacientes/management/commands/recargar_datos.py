@@ -1,15 +1,32 @@
 import csv
 from django.core.management.base import BaseCommand
-from pacientes.models import Paciente, Consulta
+from django.db import connection, transaction
+from pacientes import lineas_tiempo
+from pacientes.models import Paciente, Consulta, Medicacion
+from saludmental_dashboard.routers import fijar_primaria
 from datetime import datetime
 
 class Command(BaseCommand):
     help = 'Recarga datos borrando y cargando desde CSV'
 
+    @transaction.atomic
     def handle(self, *args, **kwargs):
-        # Borra los datos antiguos
+        # Sin marcar fila a fila: las líneas de tiempo se reconstruyen todas al final
+        with lineas_tiempo.sin_marcar():
+            self.cargar()
+        self.stdout.write("Reconstruyendo líneas de tiempo...")
+        lineas_tiempo.reconstruir_en_lotes(Paciente.objects.values_list("pk", flat=True))
+
+        transaction.on_commit(fijar_primaria)
+        self.stdout.write(self.style.SUCCESS('Datos recargados correctamente.'))
+
+    def cargar(self):
+        # Borra los datos antiguos. DELETE directo: con las señales de las líneas de
+        # tiempo, delete() cargaría cada medicación en memoria para borrarla
         self.stdout.write("Eliminando datos antiguos...")
-        Consulta.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{Medicacion._meta.db_table}"')
+            cursor.execute(f'DELETE FROM "{Consulta._meta.db_table}"')
         Paciente.objects.all().delete()
 
         # Ruta a tu archivo CSV - cambia por la ruta correcta
@@ -49,5 +66,3 @@ class Command(BaseCommand):
                     diagnostico=diagnostico
                 )
                 consulta.save()
-
-        self.stdout.write(self.style.SUCCESS('Datos recargados correctamente.'))
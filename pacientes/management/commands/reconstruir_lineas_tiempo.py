@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from pacientes import lineas_tiempo
+from pacientes.models import Paciente
+
+
+class Command(BaseCommand):
+    help = "Reconstruye las líneas de tiempo precalculadas de todos los pacientes (o de los indicados)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--paciente", type=int, nargs="*", help="IDs de paciente (default: todos)")
+        parser.add_argument("--lote", type=int, default=lineas_tiempo.LOTE, help="Pacientes por lote")
+
+    def handle(self, *args, **opts):
+        ids = opts["paciente"] or list(Paciente.objects.order_by("pk").values_list("pk", flat=True))
+
+        for i in range(0, len(ids), opts["lote"]):
+            with transaction.atomic():
+                lineas_tiempo.reconstruir(ids[i:i + opts["lote"]])
+
+        self.stdout.write(self.style.SUCCESS(f"Líneas de tiempo reconstruidas: {len(ids)}"))
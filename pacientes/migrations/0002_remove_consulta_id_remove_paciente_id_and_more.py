@@ -4,6 +4,13 @@ import django.db.models.deletion
 from django.db import migrations, models
 
 
+def rehacer_fk_sqlite(apps, schema_editor):
+    # En SQLite el AlterField de 'paciente' no regenera la tabla y 'consultas'
+    # queda referenciando pacientes(id), que ya no existe ("foreign key mismatch").
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor._remake_table(apps.get_model("pacientes", "Consulta"))
+
+
 class Migration(migrations.Migration):
 
     dependencies = [
@@ -46,4 +53,5 @@ class Migration(migrations.Migration):
             name="paciente",
             table="pacientes",
         ),
+        migrations.RunPython(rehacer_fk_sqlite, migrations.RunPython.noop),
     ]
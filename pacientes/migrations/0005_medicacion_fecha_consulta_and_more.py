@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:23
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_fecha_consulta(apps, schema_editor):
+    Consulta = apps.get_model('pacientes', 'Consulta')
+    Medicacion = apps.get_model('pacientes', 'Medicacion')
+    fecha = Consulta.objects.filter(pk=OuterRef('consulta_id')).values('fecha_consulta')[:1]
+    Medicacion.objects.using(schema_editor.connection.alias).update(fecha_consulta=Subquery(fecha))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0004_medicacion_delete_datosplanos_consulta_riesgo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicacion',
+            name='fecha_consulta',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(copiar_fecha_consulta, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='medicacion',
+            name='fecha_consulta',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['fecha_consulta'], name='consultas_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['paciente', 'fecha_consulta'], name='consultas_pac_fecha_idx'),
+        ),
+    ]
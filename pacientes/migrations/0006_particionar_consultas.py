@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations
+
+from pacientes import particiones
+
+
+def particionar(apps, schema_editor):
+    if getattr(settings, 'PARTICIONAR_CONSULTAS', False):
+        particiones.particionar(schema_editor.connection)
+
+
+def desparticionar(apps, schema_editor):
+    particiones.desparticionar(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0005_medicacion_fecha_consulta_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0006_particionar_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineaTiempoPaciente',
+            fields=[
+                ('paciente', models.OneToOneField(db_column='paciente_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='linea_tiempo', serialize=False, to='pacientes.paciente')),
+                ('fechas', models.BinaryField()),
+                ('riesgos', models.BinaryField()),
+                ('meds', models.JSONField()),
+            ],
+            options={
+                'db_table': 'lineas_tiempo',
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, router
+
+from . import particiones
 
 class Paciente(models.Model):
     paciente_id = models.AutoField(primary_key=True)
@@ -13,7 +15,26 @@ class Paciente(models.Model):
         return f"Paciente {self.numero_historia}"
 
 
-class Consulta(models.Model):
+class RecuerdaValoresCargados:
+    """Guarda los valores leídos de la base para detectar cambios al guardar."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._valores_cargados = dict(zip(field_names, values))
+        return instance
+
+    def valor_cargado(self, attname):
+        return getattr(self, '_valores_cargados', {}).get(attname)
+
+    def _recordar_valores(self):
+        self._valores_cargados = {
+            f.attname: self.__dict__[f.attname]
+            for f in self._meta.concrete_fields if f.attname in self.__dict__
+        }
+
+
+class Consulta(RecuerdaValoresCargados, models.Model):
     consulta_id = models.AutoField(primary_key=True)
     paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, db_column='paciente_id')
     fecha_consulta = models.DateField()
@@ -30,21 +51,79 @@ class Consulta(models.Model):
 
     class Meta:
         db_table = 'consultas'
+        indexes = [
+            models.Index(fields=['fecha_consulta'], name='consultas_fecha_idx'),
+            models.Index(fields=['paciente', 'fecha_consulta'], name='consultas_pac_fecha_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding or self.valor_cargado('fecha_consulta') != self.fecha_consulta:
+            fecha = self._meta.get_field('fecha_consulta').to_python(self.fecha_consulta)
+            particiones.asegurar_anio(fecha.year, kwargs.get('using') or router.db_for_write(Consulta, instance=self))
+        super().save(*args, **kwargs)
+        # Mantener sincronizada la fecha denormalizada en las medicaciones
+        # (en PostgreSQL particionado lo hace además el FK ON UPDATE CASCADE)
+        if not adding and self.valor_cargado('fecha_consulta') != self.fecha_consulta:
+            self.medicaciones.exclude(fecha_consulta=self.fecha_consulta)\
+                             .update(fecha_consulta=self.fecha_consulta)
+        self._recordar_valores()
 
     def __str__(self):
         return f"Consulta {self.consulta_id} - Paciente {self.paciente.numero_historia}"
 
 
+class MedicacionQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create no llama a save(): completar aquí la fecha copiada de la consulta
+        objs = list(objs)
+        sin_fecha = [m for m in objs if m.fecha_consulta is None]
+        ids = {m.consulta_id for m in sin_fecha if not Medicacion.consulta.is_cached(m)}
+        fechas = dict(
+            Consulta.objects.using(self.db).filter(pk__in=ids).values_list('pk', 'fecha_consulta')
+        ) if ids else {}
+        for m in sin_fecha:
+            if Medicacion.consulta.is_cached(m):
+                m.fecha_consulta = m.consulta.fecha_consulta
+            else:
+                m.fecha_consulta = fechas.get(m.consulta_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 # 🆕 Nueva tabla Medicacion
-class Medicacion(models.Model):
+class Medicacion(RecuerdaValoresCargados, models.Model):
     medicacion_id = models.AutoField(primary_key=True)
     consulta = models.ForeignKey(Consulta, on_delete=models.CASCADE, db_column='consulta_id', related_name='medicaciones')
     nombre = models.CharField(max_length=100)
     dosis = models.CharField(max_length=50, blank=True, null=True)
     esquema = models.CharField(max_length=50, blank=True, null=True)
+    # Copia de consulta.fecha_consulta: clave de partición de 'medicaciones'
+    fecha_consulta = models.DateField(editable=False)
+
+    objects = MedicacionQuerySet.as_manager()
 
     class Meta:
         db_table = 'medicaciones'
 
+    def save(self, *args, **kwargs):
+        self.fecha_consulta = self.consulta.fecha_consulta
+        super().save(*args, **kwargs)
+        self._recordar_valores()
+
     def __str__(self):
         return f"{self.nombre} ({self.dosis or ''})"
+
+
+# Línea de tiempo precalculada por paciente (ver pacientes/lineas_tiempo.py)
+class LineaTiempoPaciente(models.Model):
+    paciente = models.OneToOneField(Paciente, on_delete=models.CASCADE, primary_key=True,
+                                    db_column='paciente_id', related_name='linea_tiempo')
+    fechas = models.BinaryField()   # array('i') de date.toordinal(), en orden
+    riesgos = models.BinaryField()  # un byte (0,1,2) por consulta
+    meds = models.JSONField()       # por consulta, lista de textos de medicación ya armados
+
+    class Meta:
+        db_table = 'lineas_tiempo'
+
+    def __str__(self):
+        return f"Línea de tiempo - Paciente {self.paciente_id}"
@@ -0,0 +1,304 @@
+"""
+Particionado anual por rango de fecha de 'consultas' y 'medicaciones' (solo PostgreSQL).
+
+'consultas' se particiona por fecha_consulta y 'medicaciones' por su copia
+denormalizada de la misma fecha, de modo que un filtro desde/hasta sólo lee
+las particiones de los años pedidos. En otros motores (SQLite) todas las
+funciones son no-op.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import connections
+
+from . import transacciones
+
+# Orden importa: 'medicaciones' referencia a 'consultas'
+TABLAS = (
+    # (tabla, clave primaria, clave de partición)
+    ("consultas", "consulta_id", "fecha_consulta"),
+    ("medicaciones", "medicacion_id", "fecha_consulta"),
+)
+
+FK_MEDICACIONES = "medicaciones_consulta_fecha_fk"
+
+# Caché de este proceso, por alias (ver asegurar_anio): años cuya partición
+# ya estaba confirmada y bases que no están particionadas
+_anios_verificados = defaultdict(set)
+_sin_particionar = set()
+
+
+def soporta_particiones(connection):
+    return connection.vendor == "postgresql"
+
+
+def esta_particionada(connection, tabla):
+    if not soporta_particiones(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [tabla]
+        )
+        return cursor.fetchone() is not None
+
+
+def nombre_particion(tabla, anio):
+    return f"{tabla}_{anio}"
+
+
+def anios_particionados(connection, tabla):
+    """Años con partición adjunta a `tabla`, ordenados."""
+    if not esta_particionada(connection, tabla):
+        return []
+    return _anios_adjuntos(connection, tabla)
+
+
+def _anios_adjuntos(connection, tabla):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            [tabla],
+        )
+        nombres = [r[0] for r in cursor.fetchall()]
+    prefijo = f"{tabla}_"
+    return sorted(
+        int(n[len(prefijo):]) for n in nombres
+        if n.startswith(prefijo) and n[len(prefijo):].isdigit()
+    )
+
+
+def _crear_particion(cursor, tabla, anio):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{nombre_particion(tabla, anio)}" PARTITION OF "{tabla}" '
+        f"FOR VALUES FROM ('{anio}-01-01') TO ('{anio + 1}-01-01')"
+    )
+    # Hasta que la transacción termine, asegurar_anio no puede darla por confirmada
+    transacciones.de_la_transaccion(("particion", anio), crear=lambda: True, using=cursor.db.alias)
+
+
+def asegurar_particiones(anios, using="default"):
+    """
+    Crea (si faltan) las particiones anuales de ambas tablas para `anios`,
+    revisando cada tabla por separado. Devuelve los años en que se creó alguna.
+    """
+    connection = connections[using]
+    if not esta_particionada(connection, "consultas"):
+        return []
+    return _crear_faltantes(connection, anios)
+
+
+def _crear_faltantes(connection, anios):
+    creados = set()
+    with connection.cursor() as cursor:
+        for tabla, _, _ in TABLAS:
+            for anio in sorted(set(anios) - set(_anios_adjuntos(connection, tabla))):
+                _crear_particion(cursor, tabla, anio)
+                creados.add(anio)
+    return sorted(creados)
+
+
+def asegurar_anio(anio, using="default"):
+    """
+    Garantiza la partición de `anio` antes de guardar una consulta, sin revisar
+    el catálogo en cada guardado. El proceso recuerda las bases sin particionar
+    y los años cuya partición ya existía; una partición creada por la
+    transacción en curso sólo se recuerda hasta que ésta termine, porque un
+    rollback (o el de un savepoint) la deshace.
+
+    La caché no ve lo que hacen otros procesos: tras la migración 0006 o
+    `desvincular_particiones` hay que reiniciar los procesos web.
+    """
+    if using in _sin_particionar or anio in _anios_verificados[using]:
+        return
+    clave = ("particion", anio)
+    if transacciones.de_la_transaccion(clave, using=using):
+        return
+    connection = connections[using]
+    if not esta_particionada(connection, "consultas"):
+        _sin_particionar.add(using)
+        return
+    _crear_faltantes(connection, [anio])
+    if not transacciones.de_la_transaccion(clave, using=using):
+        # Ya existía (o se creó en autocommit): está confirmada
+        _anios_verificados[using].add(anio)
+
+
+def _olvidar(alias):
+    _sin_particionar.discard(alias)
+    _anios_verificados.pop(alias, None)
+
+
+def desvincular_particiones(hasta_anio, using="default"):
+    """
+    Separa las particiones de años <= `hasta_anio` y las renombra a
+    '<tabla>_<año>_archivo', listas para pg_dump/DROP sin tocar las tablas vivas.
+    Devuelve la lista de años desvinculados.
+    """
+    connection = connections[using]
+    if not esta_particionada(connection, "consultas"):
+        return []
+    por_tabla = {
+        tabla: {a for a in anios_particionados(connection, tabla) if a <= hasta_anio}
+        for tabla, _, _ in TABLAS
+    }
+    anios = sorted(set().union(*por_tabla.values()))
+    with connection.cursor() as cursor:
+        for anio in anios:
+            # Primero las medicaciones: su FK impide separar la consulta referenciada
+            for tabla, pk, _ in reversed(TABLAS):
+                if anio not in por_tabla[tabla]:
+                    continue
+                particion = nombre_particion(tabla, anio)
+                cursor.execute(f'ALTER TABLE "{tabla}" DETACH PARTITION "{particion}"')
+                # El default del id apunta a la secuencia de la tabla viva
+                cursor.execute(f'ALTER TABLE "{particion}" ALTER COLUMN "{pk}" DROP DEFAULT')
+                if tabla == "medicaciones":
+                    # La partición separada conserva el FK hacia 'consultas' como
+                    # restricción propia; el archivo no debe depender de las tablas vivas.
+                    cursor.execute(f'ALTER TABLE "{particion}" DROP CONSTRAINT IF EXISTS "{FK_MEDICACIONES}"')
+                cursor.execute(f'ALTER TABLE "{particion}" RENAME TO "{particion}_archivo"')
+    _anios_verificados[using].difference_update(anios)
+    return anios
+
+
+# ========= Conversión (usada por la migración 0006) =========
+
+def _definiciones(cursor, tabla):
+    """Índices (no PK) y FKs propios de `tabla`, como SQL recreable."""
+    cursor.execute(
+        """
+        SELECT i.indexname, i.indexdef FROM pg_indexes i
+        WHERE i.schemaname = current_schema() AND i.tablename = %s
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+        """,
+        [tabla],
+    )
+    indices = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype = 'f'
+        """,
+        [tabla],
+    )
+    fks = cursor.fetchall()
+    return indices, fks
+
+
+def _rango_anios(cursor):
+    """Años a particionar: unión de los de ambas tablas, y al menos hasta el año próximo."""
+    cursor.execute(
+        """
+        SELECT EXTRACT(YEAR FROM MIN(f))::int, EXTRACT(YEAR FROM MAX(f))::int FROM (
+            SELECT fecha_consulta AS f FROM consultas
+            UNION ALL
+            SELECT fecha_consulta FROM medicaciones
+        ) t
+        """
+    )
+    actual = datetime.date.today().year
+    primero, ultimo = cursor.fetchone()
+    return range(min(primero or actual, actual), max(ultimo or actual, actual + 1) + 1)
+
+
+def _reconstruir(cursor, tabla, pk, clave, anios=None):
+    """
+    Reemplaza `tabla` por una copia con los mismos datos, índices y FKs
+    salientes: particionada por año para `anios`, o simple si `anios` es None. El id pasa a usar una secuencia propia porque las
+    columnas IDENTITY no se admiten en tablas particionadas antes de PostgreSQL 17.
+    """
+    legado = f"{tabla}_legado"
+    secuencia = f"{tabla}_{pk}_seq"
+    indices, fks = _definiciones(cursor, tabla)
+
+    for nombre, _ in fks:
+        cursor.execute(f'ALTER TABLE "{tabla}" DROP CONSTRAINT "{nombre}"')
+    for nombre, _ in indices:
+        cursor.execute(f'DROP INDEX "{nombre}"')
+    cursor.execute(f'ALTER TABLE "{tabla}" ALTER COLUMN "{pk}" DROP IDENTITY IF EXISTS')
+    cursor.execute(f'ALTER TABLE "{tabla}" ALTER COLUMN "{pk}" DROP DEFAULT')
+    cursor.execute(f'DROP SEQUENCE IF EXISTS "{secuencia}"')
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'", [tabla]
+    )
+    for (nombre,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE "{tabla}" DROP CONSTRAINT "{nombre}"')
+    cursor.execute(f'ALTER TABLE "{tabla}" RENAME TO "{legado}"')
+
+    if anios is not None:
+        cursor.execute(
+            f'CREATE TABLE "{tabla}" (LIKE "{legado}" INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE ("{clave}")'
+        )
+        cursor.execute(f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{tabla}_pkey" PRIMARY KEY ("{pk}", "{clave}")')
+        for anio in anios:
+            _crear_particion(cursor, tabla, anio)
+    else:
+        cursor.execute(f'CREATE TABLE "{tabla}" (LIKE "{legado}" INCLUDING DEFAULTS)')
+        cursor.execute(f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{tabla}_pkey" PRIMARY KEY ("{pk}")')
+
+    cursor.execute(f'INSERT INTO "{tabla}" SELECT * FROM "{legado}"')
+    cursor.execute(f'DROP TABLE "{legado}"')
+
+    cursor.execute(f'CREATE SEQUENCE "{secuencia}" OWNED BY "{tabla}"."{pk}"')
+    cursor.execute(f'ALTER TABLE "{tabla}" ALTER COLUMN "{pk}" SET DEFAULT nextval(\'"{secuencia}"\')')
+    cursor.execute(
+        f'SELECT setval(\'"{secuencia}"\', COALESCE(MAX("{pk}"), 0) + 1, false) FROM "{tabla}"'
+    )
+
+    for _, definicion in indices:
+        cursor.execute(definicion)
+    for nombre, definicion in fks:
+        cursor.execute(f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{nombre}" {definicion}')
+
+
+def _fk_medicaciones_simple(cursor):
+    cursor.execute(
+        """
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = to_regclass('medicaciones') AND confrelid = to_regclass('consultas')
+        """
+    )
+    return [r[0] for r in cursor.fetchall()]
+
+
+def particionar(connection):
+    """Convierte ambas tablas a particionadas conservando los datos."""
+    if not soporta_particiones(connection) or esta_particionada(connection, "consultas"):
+        return
+    _olvidar(connection.alias)
+    with connection.cursor() as cursor:
+        # Una tabla particionada sólo puede ser referenciada por una clave que
+        # incluya la de partición: el FK pasa a ser (consulta_id, fecha_consulta).
+        for nombre in _fk_medicaciones_simple(cursor):
+            cursor.execute(f'ALTER TABLE "medicaciones" DROP CONSTRAINT "{nombre}"')
+        # Mismos años en ambas tablas: toda consulta puede recibir medicaciones
+        anios = _rango_anios(cursor)
+        for tabla, pk, clave in TABLAS:
+            _reconstruir(cursor, tabla, pk, clave, anios)
+        cursor.execute(
+            f'ALTER TABLE "medicaciones" ADD CONSTRAINT "{FK_MEDICACIONES}" '
+            'FOREIGN KEY ("consulta_id", "fecha_consulta") '
+            'REFERENCES "consultas" ("consulta_id", "fecha_consulta") '
+            'ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+def desparticionar(connection):
+    """Operación inversa de `particionar`: vuelve a tablas simples."""
+    if not esta_particionada(connection, "consultas"):
+        return
+    _olvidar(connection.alias)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "medicaciones" DROP CONSTRAINT IF EXISTS "{FK_MEDICACIONES}"')
+        for tabla, pk, clave in reversed(TABLAS):
+            _reconstruir(cursor, tabla, pk, clave)
+        cursor.execute(
+            'ALTER TABLE "medicaciones" ADD CONSTRAINT "medicaciones_consulta_id_fk_consultas" '
+            'FOREIGN KEY ("consulta_id") REFERENCES "consultas" ("consulta_id") '
+            'DEFERRABLE INITIALLY DEFERRED'
+        )
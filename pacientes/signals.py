@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import lineas_tiempo
+from .models import Consulta, Medicacion
+
+
+@receiver([post_save, post_delete], sender=Consulta)
+def consulta_cambiada(sender, instance, **kwargs):
+    lineas_tiempo.marcar(paciente_id=instance.paciente_id)
+    # Si la consulta cambió de paciente, el anterior también debe perderla
+    anterior = instance.valor_cargado('paciente_id')
+    if anterior is not None and anterior != instance.paciente_id:
+        lineas_tiempo.marcar(paciente_id=anterior)
+
+
+@receiver([post_save, post_delete], sender=Medicacion)
+def medicacion_cambiada(sender, instance, **kwargs):
+    # Se marca por consulta_id y se resuelve al confirmar: sin una consulta SQL por fila.
+    lineas_tiempo.marcar(consulta_id=instance.consulta_id)
+    anterior = instance.valor_cargado('consulta_id')
+    if anterior is not None and anterior != instance.consulta_id:
+        lineas_tiempo.marcar(consulta_id=anterior)
@@ -1,3 +1,384 @@
-from django.test import TestCase
+import datetime
+import importlib.util
+import io
+import tempfile
+from array import array
+from pathlib import Path
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from saludmental_dashboard import routers
+from . import lineas_tiempo, particiones
+from .models import Paciente, Consulta, Medicacion, LineaTiempoPaciente
+
+
+def crear_paciente(numero_historia="H-1"):
+    return Paciente.objects.create(numero_historia=numero_historia, sexo="Otro", fecha_nacimiento="2000-01-01")
+
+
+class FechaMedicacionTests(TestCase):
+    def setUp(self):
+        self.pac = crear_paciente()
+        self.con = Consulta.objects.create(paciente=self.pac, fecha_consulta=datetime.date(2024, 3, 1))
+
+    def test_save_copia_fecha_de_la_consulta(self):
+        med = Medicacion.objects.create(consulta=self.con, nombre="sertralina")
+        self.assertEqual(med.fecha_consulta, datetime.date(2024, 3, 1))
+
+    def test_bulk_create_completa_fecha(self):
+        sin_cache = Medicacion(consulta_id=self.con.pk, nombre="a")
+        con_cache = Medicacion(consulta=self.con, nombre="b")
+        Medicacion.objects.bulk_create([sin_cache, con_cache])
+        self.assertEqual(
+            set(Medicacion.objects.values_list("fecha_consulta", flat=True)), {datetime.date(2024, 3, 1)}
+        )
+
+    def test_cambio_de_fecha_actualiza_medicaciones(self):
+        Medicacion.objects.create(consulta=self.con, nombre="a")
+        con = Consulta.objects.get(pk=self.con.pk)
+        con.fecha_consulta = datetime.date(2025, 6, 1)
+        con.save()
+        self.assertEqual(Medicacion.objects.get().fecha_consulta, datetime.date(2025, 6, 1))
+
+    def test_guardar_sin_cambiar_fecha_no_toca_medicaciones(self):
+        Medicacion.objects.create(consulta=self.con, nombre="a")
+        con = Consulta.objects.get(pk=self.con.pk)
+        con.riesgo = 2
+        with CaptureQueriesContext(connection) as ctx:
+            con.save()
+        self.assertFalse([q for q in ctx.captured_queries if '"medicaciones"' in q["sql"]])
+
+    def test_guardar_en_una_transaccion_no_revisa_el_catalogo_por_fila(self):
+        with mock.patch.object(particiones, "esta_particionada", wraps=particiones.esta_particionada) as revisar:
+            with transaction.atomic():
+                for dia in range(1, 21):
+                    Consulta.objects.create(paciente=self.pac, fecha_consulta=datetime.date(2023, 1, dia))
+        self.assertLessEqual(revisar.call_count, 1)
+
+
+@skipIf(connection.vendor == "postgresql", "no-op sólo fuera de PostgreSQL")
+class ParticionesNoOpTests(TestCase):
+    def test_funciones_no_hacen_nada(self):
+        self.assertFalse(particiones.esta_particionada(connection, "consultas"))
+        self.assertEqual(particiones.anios_particionados(connection, "consultas"), [])
+        self.assertEqual(particiones.asegurar_particiones([2030]), [])
+        self.assertEqual(particiones.desvincular_particiones(2030), [])
+        particiones.particionar(connection)
+        self.assertFalse(particiones.esta_particionada(connection, "consultas"))
+
+
+@skipUnless(connection.vendor == "postgresql", "particionado sólo en PostgreSQL")
+class ParticionesPostgresTests(TestCase):
+    def setUp(self):
+        # Con PARTICIONAR_CONSULTAS=1 la base de test ya viene particionada: mismos años que dejaría particionar()
+        particiones.asegurar_particiones(range(2010, 2013))
+        pac = crear_paciente()
+        # 2010 tiene consulta pero ninguna medicación
+        Consulta.objects.create(paciente=pac, fecha_consulta=datetime.date(2010, 5, 1))
+        self.con = Consulta.objects.create(paciente=pac, fecha_consulta=datetime.date(2012, 5, 1))
+        Medicacion.objects.create(consulta=self.con, nombre="a")
+        with connection.cursor() as cursor:
+            # Los FKs diferidos pendientes impedirían el ALTER TABLE de la conversión
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        particiones.particionar(connection)
+
+    def test_ambas_tablas_tienen_los_mismos_anios(self):
+        anios = particiones.anios_particionados(connection, "consultas")
+        self.assertEqual(anios[0], 2010)
+        self.assertEqual(particiones.anios_particionados(connection, "medicaciones"), anios)
+        Medicacion.objects.create(consulta=Consulta.objects.get(fecha_consulta="2010-05-01"), nombre="b")
+
+    def test_asegurar_revisa_cada_tabla(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE "medicaciones_2011"')
+        self.assertEqual(particiones.asegurar_particiones([2011]), [2011])
+        self.assertIn(2011, particiones.anios_particionados(connection, "medicaciones"))
+
+    def test_desvincular_con_medicaciones(self):
+        self.assertEqual(particiones.desvincular_particiones(2012), [2010, 2011, 2012])
+        self.assertFalse(Consulta.objects.filter(fecha_consulta__year__lte=2012).exists())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM "medicaciones_2012_archivo"')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute(
+                "SELECT COUNT(*) FROM pg_constraint WHERE conrelid = 'medicaciones_2012_archivo'::regclass "
+                "AND contype = 'f'"
+            )
+            self.assertEqual(cursor.fetchone()[0], 0)
+        # Las tablas archivadas no bloquean volver a tablas simples
+        particiones.desparticionar(connection)
+        self.assertFalse(particiones.esta_particionada(connection, "consultas"))
+
+    def test_filtro_por_fecha_poda_particiones(self):
+        qs = Consulta.objects.filter(fecha_consulta__gte="2012-01-01", fecha_consulta__lte="2012-12-31")
+        plan = qs.explain()
+        self.assertIn("consultas_2012", plan)
+        self.assertNotIn("consultas_2010", plan)
+
+    def test_guardar_consulta_crea_la_particion_del_anio(self):
+        Consulta.objects.create(paciente=self.con.paciente, fecha_consulta=datetime.date(2001, 2, 3))
+        self.assertIn(2001, particiones.anios_particionados(connection, "consultas"))
+        self.assertIn(2001, particiones.anios_particionados(connection, "medicaciones"))
+
+    def test_particion_revertida_en_savepoint_se_vuelve_a_crear(self):
+        class Revertir(Exception):
+            pass
+
+        with self.assertRaises(Revertir), transaction.atomic():
+            Consulta.objects.create(paciente=self.con.paciente, fecha_consulta=datetime.date(2001, 2, 3))
+            raise Revertir
+        self.assertNotIn(2001, particiones.anios_particionados(connection, "consultas"))
+        Consulta.objects.create(paciente=self.con.paciente, fecha_consulta=datetime.date(2001, 2, 3))
+        self.assertIn(2001, particiones.anios_particionados(connection, "consultas"))
+
+    def test_cambio_de_anio_mueve_medicaciones(self):
+        con = Consulta.objects.get(pk=self.con.pk)
+        con.fecha_consulta = datetime.date(2010, 7, 1)
+        con.save()
+        self.assertEqual(Medicacion.objects.get().fecha_consulta, datetime.date(2010, 7, 1))
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1", "replica_2"])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        pin = override_settings(REPLICA_PIN_ARCHIVO=Path(directorio.name) / "pin")
+        pin.enable()
+        self.addCleanup(pin.disable)
+        self.router = routers.ReplicaRouter()
+
+    def leer_en_replica(self):
+        return routers.lectura_en_replica(lambda: self.router.db_for_read(Consulta))()
+
+    def test_lecturas_fuera_del_decorador_van_a_default(self):
+        self.assertIsNone(self.router.db_for_read(Consulta))
+
+    def test_lecturas_dentro_del_decorador_van_a_una_replica(self):
+        self.assertIn(self.leer_en_replica(), ["replica_1", "replica_2"])
+        self.assertIsNone(self.router.db_for_read(Consulta))
+
+    def test_escrituras_y_migraciones_en_default(self):
+        self.assertEqual(routers.lectura_en_replica(lambda: self.router.db_for_write(Consulta))(), "default")
+        self.assertTrue(self.router.allow_migrate("default", "pacientes"))
+        self.assertFalse(self.router.allow_migrate("replica_1", "pacientes"))
+
+    def test_primaria_fijada_hasta_que_vence(self):
+        routers.fijar_primaria(60)
+        self.assertTrue(routers.primaria_fijada())
+        self.assertIsNone(self.leer_en_replica())
+        routers.fijar_primaria(-1)
+        self.assertFalse(routers.primaria_fijada())
+        self.assertIsNotNone(self.leer_en_replica())
+
+    def test_pin_ilegible_no_fija(self):
+        settings.REPLICA_PIN_ARCHIVO.write_text("basura")
+        self.assertFalse(routers.primaria_fijada())
+
+    def test_pin_sin_permiso_de_escritura_solo_avisa(self):
+        archivo = settings.REPLICA_PIN_ARCHIVO.parent / "no_existe" / "pin"
+        with override_settings(REPLICA_PIN_ARCHIVO=archivo), \
+                self.assertLogs("saludmental_dashboard.routers", "WARNING"):
+            routers.fijar_primaria(60)
+            self.assertFalse(routers.primaria_fijada())
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_sin_replicas_todo_a_default(self):
+        self.assertIsNone(self.leer_en_replica())
+
+
+class ConfigurarReplicasTests(SimpleTestCase):
+    POSTGRES = {"ENGINE": "django.db.backends.postgresql", "NAME": "principal", "HOST": "localhost", "PORT": "5432"}
+
+    def test_postgres_host_puerto_y_nombre(self):
+        replicas = routers.configurar_replicas(self.POSTGRES, "db1:5433/r1, r2,")
+        self.assertEqual(list(replicas), ["replica_1", "replica_2"])
+        self.assertEqual(
+            (replicas["replica_1"]["HOST"], replicas["replica_1"]["PORT"], replicas["replica_1"]["NAME"]),
+            ("db1", "5433", "r1"),
+        )
+        self.assertEqual(
+            (replicas["replica_2"]["HOST"], replicas["replica_2"]["PORT"], replicas["replica_2"]["NAME"]),
+            ("localhost", "5432", "r2"),
+        )
+        self.assertEqual(replicas["replica_1"]["TEST"], {"MIRROR": "default"})
+
+    def test_sqlite_usa_rutas(self):
+        default = {"ENGINE": "django.db.backends.sqlite3", "NAME": "/tmp/p.sqlite3"}
+        replicas = routers.configurar_replicas(default, "/tmp/r1.sqlite3")
+        self.assertEqual(replicas["replica_1"]["NAME"], "/tmp/r1.sqlite3")
+
+    def test_vacio(self):
+        self.assertEqual(routers.configurar_replicas(self.POSTGRES, ""), {})
+
+
+class SerieTests(SimpleTestCase):
+    def setUp(self):
+        dias = [datetime.date(2024, 1, 5), datetime.date(2024, 3, 1), datetime.date(2024, 3, 1), datetime.date(2025, 1, 1)]
+        self.linea = LineaTiempoPaciente(
+            fechas=array("i", [d.toordinal() for d in dias]).tobytes(),
+            riesgos=bytes([0, 1, 2, 1]),
+            meds=[["a"], ["b"], ["c"], ["d"]],
+        )
+
+    def test_sin_filtros(self):
+        serie = lineas_tiempo.serie(self.linea)
+        self.assertEqual(serie["labels"], ["2024-01-05", "2024-03-01", "2024-03-01", "2025-01-01"])
+        self.assertEqual(serie["riesgo"], [0, 1, 2, 1])
+
+    def test_rango_inclusivo(self):
+        serie = lineas_tiempo.serie(self.linea, datetime.date(2024, 3, 1), datetime.date(2024, 3, 1))
+        self.assertEqual(serie["labels"], ["2024-03-01", "2024-03-01"])
+        self.assertEqual(serie["meds"], [["b"], ["c"]])
+
+    def test_rango_vacio(self):
+        serie = lineas_tiempo.serie(self.linea, datetime.date(2026, 1, 1))
+        self.assertEqual(serie, {"labels": [], "riesgo": [], "meds": []})
+
+
+class LineaTiempoTests(TestCase):
+    def setUp(self):
+        self.pac = crear_paciente()
+
+    def labels(self, paciente):
+        return lineas_tiempo.serie(LineaTiempoPaciente.objects.get(pk=paciente.pk))["labels"]
+
+    def test_guardar_reconstruye_al_confirmar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            con = Consulta.objects.create(paciente=self.pac, fecha_consulta="2024-03-01", riesgo=2)
+            Medicacion.objects.create(consulta=con, nombre="sertralina", dosis="50mg", esquema="nan")
+            Medicacion.objects.create(consulta=con, nombre="nan")
+        linea = lineas_tiempo.serie(LineaTiempoPaciente.objects.get(pk=self.pac.pk))
+        self.assertEqual(linea, {"labels": ["2024-03-01"], "riesgo": [2], "meds": [["sertralina 50mg"]]})
+
+    def test_borrar_reconstruye(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            con = Consulta.objects.create(paciente=self.pac, fecha_consulta="2024-03-01")
+            med = Medicacion.objects.create(consulta=con, nombre="a")
+            Consulta.objects.create(paciente=self.pac, fecha_consulta="2024-04-01")
+        with self.captureOnCommitCallbacks(execute=True):
+            med.delete()
+        self.assertEqual(LineaTiempoPaciente.objects.get().meds[0], [lineas_tiempo.SIN_MEDICACION])
+        with self.captureOnCommitCallbacks(execute=True):
+            con.delete()
+        self.assertEqual(self.labels(self.pac), ["2024-04-01"])
+
+    def test_mover_consulta_actualiza_ambos_pacientes(self):
+        otro = crear_paciente("H-2")
+        with self.captureOnCommitCallbacks(execute=True):
+            Consulta.objects.create(paciente=self.pac, fecha_consulta="2024-03-01")
+        con = Consulta.objects.get()
+        con.paciente = otro
+        with self.captureOnCommitCallbacks(execute=True):
+            con.save()
+        self.assertEqual(self.labels(self.pac), [])
+        self.assertEqual(self.labels(otro), ["2024-03-01"])
+
+    def test_borrado_masivo_sin_consulta_por_medicacion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for dia in (1, 2):
+                con = Consulta.objects.create(paciente=self.pac, fecha_consulta=f"2024-03-0{dia}")
+                Medicacion.objects.bulk_create([Medicacion(consulta=con, nombre=f"m{k}") for k in range(10)])
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            Consulta.objects.all().delete()
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('SELECT') and 'FROM "consultas"' in q["sql"]]
+        # Borrado, resolución de pacientes y reconstrucción: no una por medicación
+        self.assertLessEqual(len(selects), 3)
+        self.assertEqual(self.labels(self.pac), [])
+
+    def test_una_reconstruccion_por_transaccion(self):
+        with mock.patch.object(lineas_tiempo, "reconstruir", wraps=lineas_tiempo.reconstruir) as reconstruir:
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                for dia in range(1, 6):
+                    con = Consulta.objects.create(paciente=self.pac, fecha_consulta=f"2024-03-0{dia}")
+                    Medicacion.objects.create(consulta=con, nombre="a")
+        reconstruir.assert_called_once()
+        self.assertEqual(len(self.labels(self.pac)), 5)
+
+    def test_un_solo_callback_por_transaccion(self):
+        with lineas_tiempo.sin_marcar():
+            con = Consulta.objects.create(paciente=self.pac, fecha_consulta="2024-03-01")
+        with self.captureOnCommitCallbacks() as callbacks:
+            for k in range(20):
+                Medicacion.objects.create(consulta=con, nombre=f"m{k}")
+        self.assertEqual(len(callbacks), 1)
+
+    def test_sin_marcar_y_reconstruir_en_lotes(self):
+        with self.captureOnCommitCallbacks(execute=True), lineas_tiempo.sin_marcar():
+            Consulta.objects.create(paciente=self.pac, fecha_consulta="2024-03-01")
+        self.assertFalse(LineaTiempoPaciente.objects.exists())
+        lineas_tiempo.reconstruir_en_lotes([self.pac.pk])
+        self.assertEqual(self.labels(self.pac), ["2024-03-01"])
+
+    def test_pendientes_en_lotes(self):
+        pacientes = [crear_paciente(f"L-{k}") for k in range(5)]
+        with mock.patch.object(lineas_tiempo, "LOTE", 2), \
+                mock.patch.object(lineas_tiempo, "reconstruir") as reconstruir:
+            with self.captureOnCommitCallbacks(execute=True):
+                for p in pacientes:
+                    lineas_tiempo.marcar(paciente_id=p.pk)
+        self.assertEqual([len(c.args[0]) for c in reconstruir.call_args_list], [2, 2, 1])
+
+    @override_settings(DATABASE_REPLICAS=["replica_inexistente"])
+    def test_reconstruir_lee_de_default_aun_en_vista_de_replica(self):
+        Consulta.objects.create(paciente=self.pac, fecha_consulta="2024-03-01")
+        lineas = routers.lectura_en_replica(lambda: lineas_tiempo.reconstruir([self.pac.pk]))()
+        self.assertEqual(len(lineas[self.pac.pk].meds), 1)
+
+    @skipUnless(importlib.util.find_spec("pandas") and importlib.util.find_spec("openpyxl"),
+                "import_meds requiere pandas y openpyxl")
+    def test_import_meds_actualiza_lineas(self):
+        import pandas as pd
+
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        archivo = Path(directorio.name) / "meds.xlsx"
+        pd.DataFrame({
+            "ID_paciente": [self.pac.pk, self.pac.pk, self.pac.pk],
+            "fecha_consulta": ["2024-03-01", "2024-03-01", "2024-05-01"],
+            "riesgo": ["NEG", "NEG", "POS"],
+            "relato_consulta": ["r", "r", "r"],
+            "med": ["sertralina", "clonazepam", "sertralina"],
+        }).to_excel(archivo, index=False)
+
+        with override_settings(REPLICA_PIN_ARCHIVO=Path(directorio.name) / "pin"), \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command("import_meds", file=str(archivo), stdout=io.StringIO())
+        linea = lineas_tiempo.serie(LineaTiempoPaciente.objects.get(pk=self.pac.pk))
+        self.assertEqual(linea["labels"], ["2024-03-01", "2024-05-01"])
+        self.assertEqual(linea["riesgo"], [2, 0])
+        self.assertEqual(linea["meds"][0], ["sertralina", "clonazepam"])
+
+
+class ApiEvolucionTests(TestCase):
+    def setUp(self):
+        self.pac = crear_paciente()
+        with self.captureOnCommitCallbacks(execute=True):
+            for fecha in ("2024-01-05", "2024-03-01", "2025-01-01"):
+                Consulta.objects.create(paciente=self.pac, fecha_consulta=fecha)
+
+    def url(self, paciente_id):
+        return f"/api/pacientes/{paciente_id}/evolucion/"
+
+    def test_una_sola_consulta_y_recorte(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url(self.pac.pk), {"desde": "2024-1-5", "hasta": "2024-12-31"}).json()
+        self.assertEqual(data["labels"], ["2024-01-05", "2024-03-01"])
+
+    def test_fecha_invalida_devuelve_400(self):
+        for valor in ("ayer", "2024-02-30"):
+            self.assertEqual(self.client.get(self.url(self.pac.pk), {"desde": valor}).status_code, 400)
+
+    def test_paciente_inexistente_404(self):
+        self.assertEqual(self.client.get(self.url(9999)).status_code, 404)
+
+    def test_linea_faltante_se_construye(self):
+        LineaTiempoPaciente.objects.all().delete()
+        data = self.client.get(self.url(self.pac.pk)).json()
+        self.assertEqual(len(data["labels"]), 3)
+        self.assertTrue(LineaTiempoPaciente.objects.filter(pk=self.pac.pk).exists())
@@ -0,0 +1,42 @@
+"""
+Estado por transacción guardado en la conexión.
+
+Django no avisa cuando una transacción se revierte, pero sí saca de la cola
+on_commit los callbacks registrados en ella (o en el savepoint revertido).
+Cada estado se registra con su propio callback y vale mientras ese callback
+siga en la cola: al confirmar o revertir deja de valer sin más trabajo.
+"""
+from django.db import transaction
+
+_ATRIBUTO = "_estado_transaccion"
+
+
+def de_la_transaccion(clave, crear=None, using=None):
+    """
+    Estado `clave` de la transacción en curso. Si no hay uno vigente y se da
+    `crear`, lo crea con `crear()`; si no, devuelve None. Fuera de un bloque
+    atómico siempre devuelve None.
+
+    Un estado invocable se llama una sola vez al confirmar y deja de valer
+    desde ese momento; un valor simple vale hasta que la transacción termine.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+    estados = connection.__dict__.setdefault(_ATRIBUTO, {})
+    actual = estados.get(clave)
+    if actual is not None and any(f is actual[0] for _, f, _ in connection.run_on_commit):
+        return actual[1]
+    if crear is None:
+        return None
+    valor = crear()
+
+    def al_confirmar():
+        if callable(valor):
+            if estados.get(clave, (None,))[0] is al_confirmar:
+                del estados[clave]
+            valor()
+
+    estados[clave] = (al_confirmar, valor)
+    transaction.on_commit(al_confirmar, using=connection.alias)
+    return valor
@@ -1,8 +1,13 @@
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
-from django.db.models import Count, Prefetch
-from .models import Paciente, Consulta, Medicacion
-
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count
+from django.utils.dateparse import parse_date
+from saludmental_dashboard.routers import lectura_en_replica
+from . import lineas_tiempo
+from .models import Paciente, Consulta, LineaTiempoPaciente
+
+@lectura_en_replica
 def dashboard(request):
     sexo_filter = request.GET.get('sexo', '')
     desde_filter = request.GET.get('desde', '')
@@ -81,36 +86,23 @@ def dashboard(request):
 
 
 # ========= API: serie de evolución con medicamentos en tooltip =========
+@lectura_en_replica
 def api_evolucion_paciente(request, paciente_id: int):
-    desde = request.GET.get('desde')
-    hasta = request.GET.get('hasta')
-
-    pac = get_object_or_404(Paciente, pk=paciente_id)
-    qs = Consulta.objects.filter(paciente=pac).order_by('fecha_consulta')
-    if desde:
-        qs = qs.filter(fecha_consulta__gte=desde)
-    if hasta:
-        qs = qs.filter(fecha_consulta__lte=hasta)
-
-    qs = qs.prefetch_related(Prefetch('medicaciones', queryset=Medicacion.objects.order_by('medicacion_id')))
-
-    labels, riesgo, meds = [], [], []
-    for c in qs:
-        labels.append(c.fecha_consulta.strftime("%Y-%m-%d"))
-        riesgo.append(c.riesgo)
-        items = []
-        for m in c.medicaciones.all():
-            nombre = (m.nombre or "").strip()
-            dosis = (m.dosis or "").strip()
-            esquema = (m.esquema or "").strip()
-            if not nombre or nombre.lower() == "nan":
-                continue
-            txt = nombre
-            if dosis and dosis.lower() != "nan":
-                txt += f" {dosis}"
-            if esquema and esquema.lower() != "nan":
-                txt += f" ({esquema})"
-            items.append(txt)
-        meds.append(items or ["Sin medicación registrada"])
-
-    return JsonResponse({"labels": labels, "riesgo": riesgo, "meds": meds})
+    fechas = {}
+    for nombre in ('desde', 'hasta'):
+        valor = request.GET.get(nombre)
+        try:
+            fechas[nombre] = parse_date(valor) if valor else None
+        except ValueError:  # bien formada pero inexistente, p. ej. 2024-02-30
+            fechas[nombre] = None
+        if valor and fechas[nombre] is None:
+            return JsonResponse({"error": f"Fecha inválida en '{nombre}': {valor}"}, status=400)
+
+    # Línea de tiempo precalculada: una búsqueda por PK, sin unir consultas/medicaciones
+    linea = LineaTiempoPaciente.objects.filter(pk=paciente_id).first()
+    if linea is None:
+        # Aún no construida (o la réplica no la tiene todavía): se arma desde 'default'
+        get_object_or_404(Paciente.objects.using(DEFAULT_DB_ALIAS), pk=paciente_id)
+        linea = lineas_tiempo.reconstruir([paciente_id])[paciente_id]
+
+    return JsonResponse(lineas_tiempo.serie(linea, fechas['desde'], fechas['hasta']))
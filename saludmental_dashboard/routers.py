@@ -0,0 +1,98 @@
+"""
+Router de réplicas de lectura.
+
+Sólo el trabajo marcado explícitamente como de lectura (vistas decoradas con
+`lectura_en_replica`) lee de las réplicas; todo lo demás, incluidas las
+lecturas dentro de una importación, sigue en 'default'. Tras una importación
+`fijar_primaria()` desvía también esas lecturas a 'default' durante
+REPLICA_PIN_SEGUNDOS para que el dashboard vea enseguida lo importado.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def configurar_replicas(default, valor):
+    """
+    Alias 'replica_N' a partir de DB_REPLICAS ("[host[:puerto]/]nombre,...";
+    con SQLite, rutas de archivo). Cada réplica copia la configuración de `default`.
+    """
+    replicas = {}
+    for i, entrada in enumerate(filter(None, (e.strip() for e in valor.split(','))), start=1):
+        replica = dict(default, TEST={'MIRROR': 'default'})
+        servidor, _, nombre = entrada.rpartition('/')
+        if servidor and 'sqlite' not in replica['ENGINE']:
+            replica['HOST'], _, puerto = servidor.partition(':')
+            replica['PORT'] = puerto or replica['PORT']
+        else:
+            nombre = entrada
+        replica['NAME'] = nombre
+        replicas[f'replica_{i}'] = replica
+    return replicas
+
+
+# Alias de réplica elegido para la petición en curso (None = usar 'default')
+_replica_actual = ContextVar('replica_actual', default=None)
+
+
+def fijar_primaria(segundos=None):
+    """
+    Envía las lecturas a 'default' durante `segundos` (en todos los procesos
+    del host). Se llama tras confirmar una importación: si no se puede escribir
+    el archivo sólo se avisa, la importación ya quedó guardada.
+    """
+    segundos = settings.REPLICA_PIN_SEGUNDOS if segundos is None else segundos
+    archivo = settings.REPLICA_PIN_ARCHIVO
+    temporal = archivo.with_suffix('.tmp')
+    try:
+        temporal.write_text(str(time.time() + segundos))
+        temporal.replace(archivo)
+    except OSError as e:
+        logger.warning("No se pudo fijar la primaria en %s: %s", archivo, e)
+
+
+def primaria_fijada():
+    try:
+        return float(settings.REPLICA_PIN_ARCHIVO.read_text()) > time.time()
+    except (OSError, ValueError):
+        return False
+
+
+def elegir_replica():
+    """Réplica para una unidad de trabajo de lectura, o None si hay que usar 'default'."""
+    if not settings.DATABASE_REPLICAS or primaria_fijada():
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def lectura_en_replica(func):
+    """Decorador: las lecturas ORM dentro de `func` van a una única réplica."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _replica_actual.set(elegir_replica())
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _replica_actual.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica_actual.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas son copias de 'default': los objetos son intercambiables
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
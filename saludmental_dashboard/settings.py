@@ -1,6 +1,8 @@
 from pathlib import Path
 import os  # AÑADIDO
 
+from saludmental_dashboard.routers import configurar_replicas
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = "django-insecure-z5)cnz1+n8(3s*v@l-^z3ah@y9ihu&9os0h#fjh!seuhpx-=v0"
@@ -51,8 +53,8 @@ WSGI_APPLICATION = "saludmental_dashboard.wsgi.application"
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'centro_salud_mental',
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql'),
+        'NAME': os.environ.get('DB_NAME', 'centro_salud_mental'),
         'USER': 'postgres',
         'PASSWORD': '1234',
         'HOST': 'localhost',
@@ -60,6 +62,22 @@ DATABASES = {
     }
 }
 
+# Réplicas de solo lectura: DB_REPLICAS="[host[:puerto]/]nombre,..." (con SQLite, rutas de archivo).
+# Cada una copia la configuración de 'default' y recibe las lecturas del dashboard y la API.
+replicas = configurar_replicas(DATABASES['default'], os.environ.get('DB_REPLICAS', ''))
+DATABASES.update(replicas)
+DATABASE_REPLICAS = list(replicas)
+
+DATABASE_ROUTERS = ['saludmental_dashboard.routers.ReplicaRouter']
+
+# "Leer lo escrito": tras una importación, todas las lecturas van a 'default' durante estos segundos.
+# La marca es un archivo local: sólo alcanza a los procesos web del mismo host que corrió la importación.
+REPLICA_PIN_SEGUNDOS = int(os.environ.get('REPLICA_PIN_SEGUNDOS', '30'))
+REPLICA_PIN_ARCHIVO = BASE_DIR / '.replica_pin'
+
+# Particionado anual de 'consultas'/'medicaciones' (solo PostgreSQL, se aplica en la migración 0006)
+PARTICIONAR_CONSULTAS = os.environ.get('PARTICIONAR_CONSULTAS', '0') == '1'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",